@@ -1,12 +1,21 @@
+import time
+RUN_START = time.perf_counter()
+
 import streamlit as st
 import streamlit.components.v1 as components
 from io import StringIO
-from parse_trace import parse_to_df, create_prompt
-from chatUtils import open_client, setup_chat, generate_summary, \
+from parse_trace import create_prompt, ost_to_text
+from compare_traces import load_traces, compare_traces, format_comparison
+from trace_store import content_hash
+from rollups import issue_rollups
+from ost_stats import explode_osts, ost_load, OST_ISSUES
+from diagnosis_context import issue_context
+from shared_resources import shared_client, app_page, shared_trace, resident_traces, report_timings
+from chatUtils import setup_chat, generate_summary, \
     query_summary_run, get_final_summary, get_all_diagnoses, \
-    query_diagnosis_runs, get_final_diagnoses, ISSUE_LABELS, FINAL_STATUS, FAILED_STATUS
+    query_diagnosis_runs, get_final_diagnoses, create_comparison_assistant, generate_comparison, \
+    ISSUE_LABELS, FINAL_STATUS, FAILED_STATUS
 import os
-import time
 
 # Title
 st.set_page_config(page_title="ION: I/O Navigator")
@@ -14,9 +23,10 @@ st.set_page_config(page_title="ION: I/O Navigator")
 # Sidebar
 st.sidebar.title("Options")
 openai_api_key = st.sidebar.text_input("OpenAI API Key", type="password")
-os.environ["OPENAI_API_KEY"] = openai_api_key
 
-chat_client = open_client()
+chat_client = shared_client(openai_api_key)
+
+compare_mode = st.sidebar.checkbox("Compare multiple traces")
 
 st.sidebar.header("Issues to Analyze: ")
 
@@ -35,9 +45,10 @@ issues = {
 }
 
 
-def parse_file(uploaded_file) -> str:
+def parse_file(uploaded_file):
     """
     Verifies that a proper text file is uploaded and then parses the log file into a CSV file, returning the file path
+    and the parsed dataframe
     :param uploaded_file:
     :return:
     """
@@ -50,16 +61,47 @@ def parse_file(uploaded_file) -> str:
             try:
                 stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
                 string_data = stringio.read()
-                df, trace_start_time, full_runtime = parse_to_df(string_data)
-                file_path = f'csv/{uploaded_file.name.split(".")[0]}.csv'
-                df.to_csv(file_path, index=False)
+                df, trace_entry = shared_trace(string_data, uploaded_file.name)
+                # keep the hash in the name so re-uploads under the same file name do not overwrite older runs
+                file_path = f'csv/{uploaded_file.name.split(".")[0]}_{trace_entry["trace_id"]}.csv'
+                if not os.path.exists(file_path):
+                    ost_to_text(df).to_csv(file_path, index=False)
 
                 st.success("File successfully parsed and saved!", icon="✅")
-                return file_path
+                return file_path, df
             except Exception as e:
                 st.exception(f"I am sorry. Something wrong occurred, please try again: {e}")
 
 
+def parse_comparison_files(uploaded_files):
+    """
+    Parses the uploaded traces for comparison mode and computes their comparison table, returning None on failure.
+    Traces uploaded under the same file name are told apart by their content hash, identical uploads are skipped
+    :param uploaded_files:
+    :return:
+    """
+    try:
+        traces = {}
+        seen_hashes = set()
+        for f in uploaded_files:
+            string_data = f.getvalue().decode("utf-8")
+            trace_hash = content_hash(string_data)
+            if trace_hash in seen_hashes:
+                st.warning(f"Skipping {f.name}, the same trace was uploaded more than once.", icon="⚠")
+                continue
+            seen_hashes.add(trace_hash)
+            name = f.name if f.name not in traces else f"{f.name} ({trace_hash[:8]})"
+            traces[name] = string_data
+        if len(traces) < 2:
+            st.warning("Please upload at least two different Darshan traces to compare!", icon="⚠")
+            return None
+        # traces already analyzed by any session are reused from memory
+        frames, _ = load_traces(traces, resident=resident_traces())
+        return compare_traces(frames)
+    except Exception as e:
+        st.exception(f"I am sorry. Something wrong occurred, please try again: {e}")
+
+
 def display_diagnosis_status(diagnosis_run_status, selected_issues):
     for i, issue in enumerate(diagnosis_run_status.keys()):
         with st.expander(f"Analyzing {selected_issues[i]} ..."):
@@ -72,12 +114,60 @@ def display_diagnosis_status(diagnosis_run_status, selected_issues):
 
 
 # Render HTML
-with open("./assets/app.html") as f:
-    page = f.read()
-    components.html(page)
+components.html(app_page())
+
+# Comparison Mode
+if compare_mode:
+    uploaded_files = st.file_uploader("Please enter the Darshan DXT Traces to compare (txt files only)",
+                                      accept_multiple_files=True)
+    compare = st.button("Compare Darshan traces!")
+
+    if not openai_api_key.startswith("sk-"):
+        st.warning("Please make sure a proper OpenAI API Key is entered!", icon="⚠")
+
+    report_timings("Comparison", RUN_START)
+
+    if compare and len(uploaded_files) < 2:
+        st.warning("Please upload at least two Darshan traces to compare!", icon="⚠")
+    elif compare and any(not f.name.endswith(".txt") for f in uploaded_files):
+        st.warning("Please make sure you upload proper .txt files!", icon="⚠")
+    elif compare and openai_api_key.startswith("sk-"):
+        with st.spinner("Parsing traces..."):
+            comparison = parse_comparison_files(uploaded_files)
+        if comparison is None:
+            st.stop()
+        st.dataframe(comparison)
+        st.bar_chart(comparison[['bandwidth_MiBps']])
+        st.bar_chart(comparison[['iops']])
+
+        comparison_assistant = create_comparison_assistant(chat_client)
+        comparison_thread, comparison_run = generate_comparison(chat_client, comparison_assistant,
+                                                                format_comparison(comparison))
+        comparison_status = query_summary_run(chat_client, comparison_thread, comparison_run)
+        progress_bar = st.progress(0)
+        for timeout_step in range(100):
+            if comparison_status in FINAL_STATUS:
+                break
+            else:
+                progress_bar.progress(timeout_step / 100)
+            comparison_status = query_summary_run(chat_client, comparison_thread, comparison_run)
+            time.sleep(1)
+        comparison_summary = get_final_summary(chat_client, comparison_thread, comparison_run)
+        progress_bar.progress(100)
+        if comparison_summary is None:
+            st.error(f"Comparison failed! Please try again.")
+        else:
+            st.markdown(f"## Comparison: \n{comparison_summary['text']}")
+            st.download_button(
+                label="Download Comparison",
+                data=comparison_summary['text'],
+                file_name=f"comparison.md",
+            )
+    st.stop()
 
 # File Upload Form
 new_file = None
+trace_df = None
 
 uploaded_file = st.file_uploader("Please enter your Darshan DXT Trace (txt files only)")
 submit = st.button("Analyze Darshan trace!")
@@ -86,7 +176,11 @@ if not openai_api_key.startswith("sk-"):
     st.warning("Please make sure a proper OpenAI API Key is entered!", icon="⚠")
 
 if openai_api_key.startswith("sk-") and uploaded_file is not None:
-    new_file = parse_file(uploaded_file)
+    parsed = parse_file(uploaded_file)
+    if parsed is not None:
+        new_file, trace_df = parsed
+
+report_timings("Analysis", RUN_START)
 
 if submit and new_file is not None:
     # Extract selected issues from checklist
@@ -96,12 +190,30 @@ if submit and new_file is not None:
     tabs = {chat_formatted_issues[i]: tabs[i] for i in range(len(chat_formatted_issues))}
 
     progress_bars = {}
+    issue_contexts = {}
+    exploded_osts = None
+    ost_loads = None
     for issue in tabs:
         with tabs[issue]:
+            for chart_title, chart_series in issue_rollups(trace_df, issue):
+                st.markdown(f"**{chart_title}**")
+                st.line_chart(chart_series)
+            if issue in OST_ISSUES and exploded_osts is None:
+                # computed once and reused for the OST context below
+                exploded_osts = explode_osts(trace_df)
+                if len(exploded_osts) > 0:
+                    ost_loads = ost_load(trace_df, exploded_osts)
+            if issue in OST_ISSUES and ost_loads is not None:
+                st.markdown("**bytes per OST**")
+                st.bar_chart(ost_loads[['bytes']])
             progress_bars[issue] = st.progress(0)
+        context = issue_context(trace_df, issue, exploded_osts, ost_loads)
+        if context is not None:
+            issue_contexts[issue] = context
 
     diagnosis_runs, diagnosis_run_status, diagnosis_threads = get_all_diagnoses(chat_client, assistant, chat_file.id,
-                                                                                chat_formatted_issues)
+                                                                                chat_formatted_issues,
+                                                                                issue_contexts)
     # start a new async thread to check the status of the runs
     in_progress_threads = diagnosis_threads.copy()
     in_progress_runs = diagnosis_runs.copy()
@@ -48,7 +48,7 @@ COLUMN_DESCRIPTION = {
         "size": "amount of data read from or written to a file during an I/O operation in bytes",
         "start": "unix timestamp of the start of the I/O operation",
         "end": "unix timestamp of the end of the I/O operation",
-        "ost": "lustre OST used by the I/O operation",
+        "ost": "comma-separated IDs of the lustre OSTs used by the I/O operation",
         "consec": "boolean to indicate if current offset is greater than the previous offset+size",
         "seq": "boolean to indicate if current offset is equal to the previous offset + size"
 }
@@ -57,7 +57,10 @@ FAILED_STATUS = ['expired', 'cancelled', 'failed']
 
 SUMMARY_TEMPLATE = "You are an expert in HPC I/O performance analysis. You will be given a list of diagnosis summaries for a number of different I/O related issues originating from the same application trace log. Your job is to carefully analyze each of these summaries and form a conclusion which indicates the most prominent I/O performance issues for the underlying application. Here is the list of summaries, organized by issue type: \n"
 
-def format_prompt(issue):
+COMPARISON_TEMPLATE = "You are an expert in HPC I/O performance analysis. You will be given a table of I/O metrics computed from several Darshan traces of related runs of an application, e.g. the same benchmark with different transfer sizes or file layouts. Your job is to carefully compare the runs, explain which configuration achieves the best I/O performance and why, and point out any I/O performance issues which differ between the runs. Note that, the system on which the traces were collected has a maximum RPC size of 4MB. Following your analysis, write a brief summary of your comparison in the following format:\n\
+                    Comparison: <summary of your comparison>\n"
+
+def format_prompt(issue, context=None):
     #header = parse_darshan_log_header(file)
 
     prompt = f"""
@@ -67,6 +70,8 @@ def format_prompt(issue):
 
         {ISSUES[issue]}
     """
+    if context is not None:
+        prompt += f"\n{context}"
     return prompt
 
 def create_selected_issues(issues):
@@ -76,8 +81,8 @@ def create_selected_issues(issues):
             selected_issues.append(key)
     return selected_issues
 
-def open_client():
-    client = OpenAI()
+def open_client(api_key=None):
+    client = OpenAI(api_key=api_key)
     return client
 
 def create_assistant(client, file_id):
@@ -112,8 +117,8 @@ def run_threads(client, assistant, threads):
 
     return runs, run_status
 
-def create_diagnosis_prompt(issue, file_id):
-    prompt = format_prompt(issue)
+def create_diagnosis_prompt(issue, file_id, context=None):
+    prompt = format_prompt(issue, context)
     message = {
         'role': 'user',
         'content': prompt,
@@ -121,10 +126,11 @@ def create_diagnosis_prompt(issue, file_id):
     }
     return message
 
-def get_all_diagnoses(client, assistant, file_id, selected_issues):
+def get_all_diagnoses(client, assistant, file_id, selected_issues, contexts=None):
     threads = {}
+    contexts = contexts or {}
     for issue in selected_issues:
-        message = create_diagnosis_prompt(issue, file_id)
+        message = create_diagnosis_prompt(issue, file_id, contexts.get(issue))
         threads[issue] = client.beta.threads.create(
             messages=[message]
         )
@@ -292,6 +298,27 @@ def get_final_summary(client, summary_thread, summary_run):
     else:
         return None
 
+def create_comparison_assistant(client):
+    assistant = client.beta.assistants.create(
+        instructions="Please compare the I/O behavior of the given application runs",
+        model='gpt-4-1106-preview'
+    )
+    return assistant
+
+def generate_comparison(client, assistant, comparison_summary):
+    message = {
+        'role': 'user',
+        'content': COMPARISON_TEMPLATE + comparison_summary
+    }
+    comparison_thread = client.beta.threads.create(
+            messages=[message]
+    )
+    comparison_run = client.beta.threads.runs.create(
+        thread_id=comparison_thread.id,
+        assistant_id=assistant.id
+    )
+    return comparison_thread, comparison_run
+
 def setup_chat(client, file_path, selected_issues):
     selected_issues = create_selected_issues(selected_issues)
     file = add_file(client, file_path)
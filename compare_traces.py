@@ -0,0 +1,172 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from parse_trace import parse_to_df
+from trace_store import STORE_DIR, content_hash, get_trace_by_hash, job_name_from_file, load_trace, open_catalog, \
+    parse_nprocs, store_trace
+
+DATA_OPERATIONS = ['read', 'write']
+# columns needed to compute the comparison metrics, anything else is left on disk
+METRIC_COLUMNS = ['rank', 'operation', 'size', 'start', 'end', 'consec', 'seq']
+# inclusive upper bounds of the request size buckets, the last bucket is unbounded. Same buckets darshan uses for
+# its SIZE_* counters, e.g. a 1 MiB request is counted in 100K_1M
+SIZE_BUCKET_BOUNDS = [100, 1024, 10 * 1024, 100 * 1024, 1024 ** 2, 4 * 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2,
+                      1024 ** 3]
+SIZE_BIN_LABELS = ['0_100', '100_1K', '1K_10K', '10K_100K', '100K_1M', '1M_4M', '4M_10M', '10M_100M', '100M_1G',
+                   '1G_PLUS']
+METRIC_DESCRIPTION = {
+    "nprocs": "number of ranks that issued I/O",
+    "read_MiB / write_MiB": "total data read / written in MiB",
+    "read_ops / write_ops": "number of read / write requests",
+    "io_window_s": "seconds between the first and the last read or write request",
+    "bandwidth_MiBps": "read+write MiB divided by io_window_s",
+    "iops": "read+write requests divided by io_window_s",
+    "mean_request_KiB": "mean read/write request size in KiB",
+    "seq_ratio": "fraction of read/write requests whose offset equals the previous offset + size",
+    "consec_ratio": "fraction of read/write requests whose offset is at or past the previous offset + size",
+    "rank_bytes_skew": "max bytes moved by a single rank divided by the mean over ranks (1.0 is perfectly balanced)",
+    "rank_time_skew": "max time a single rank spent in I/O divided by the mean over ranks",
+    "size_<lo>_<hi>": "fraction of read/write requests with a size in (lo, hi] bytes, size_0_100 includes 0"
+}
+# seconds to wait for the worker processes to parse all traces
+PARSE_TIMEOUT = 600
+
+
+def _parse_trace(txt_output):
+    return parse_to_df(txt_output)
+
+
+def _parse_all(traces, max_workers=None, timeout=PARSE_TIMEOUT):
+    """
+    Parses several traces, in worker processes when there is more than one
+    :param traces: dict of file name -> raw trace text
+    :return: dict of file name -> (df, trace_start_time, full_runtime)
+    """
+    if len(traces) == 1:
+        return {file_name: _parse_trace(txt_output) for file_name, txt_output in traces.items()}
+    max_workers = max_workers or min(len(traces), os.cpu_count() or 1)
+    # spawn rather than fork: the caller may be one of many threads of a server, and a child forked while another
+    # thread holds a lock (logging, imports, sqlite) can hang forever
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        futures = {file_name: pool.submit(_parse_trace, txt_output) for file_name, txt_output in traces.items()}
+        deadline = time.monotonic() + timeout
+        return {file_name: future.result(timeout=max(deadline - time.monotonic(), 0))
+                for file_name, future in futures.items()}
+    finally:
+        # do not wait for workers still running after a timeout or an error
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_traces(traces, store_dir=STORE_DIR, max_workers=None, resident=None):
+    """
+    Loads several traces for comparison. Traces already held in memory are reused, traces already in the trace store
+    are read back with only the metric columns, the remaining ones are parsed in parallel worker processes and then
+    stored
+    :param traces: dict of file name -> raw trace text
+    :param resident: mapping of content hash -> parsed dataframe of traces already in memory, e.g.
+        shared_resources.resident_traces()
+    :return: dict of file name -> dataframe, dict of file name -> catalog entry
+    """
+    frames = {}
+    entries = {}
+    to_parse = {}
+    conn = open_catalog(store_dir)
+    try:
+        for file_name, txt_output in traces.items():
+            trace_hash = content_hash(txt_output)
+            entry = get_trace_by_hash(conn, trace_hash)
+            df = resident.get(trace_hash) if resident is not None else None
+            if df is not None:
+                frames[file_name] = df[METRIC_COLUMNS]
+                entries[file_name] = entry
+            elif entry is not None:
+                frames[file_name] = load_trace(entry['trace_id'], columns=METRIC_COLUMNS, store_dir=store_dir)
+                entries[file_name] = entry
+            else:
+                to_parse[file_name] = trace_hash
+
+        parsed = _parse_all({file_name: traces[file_name] for file_name in to_parse}, max_workers) if to_parse else {}
+        # the catalog is written from this process only, workers just parse
+        for file_name, (df, trace_start_time, full_runtime) in parsed.items():
+            entries[file_name] = store_trace(conn, df, job_name_from_file(file_name), to_parse[file_name],
+                                             trace_start_time, full_runtime, nprocs=parse_nprocs(traces[file_name]),
+                                             store_dir=store_dir)
+            frames[file_name] = df
+    finally:
+        conn.close()
+    return frames, entries
+
+
+def trace_metrics(df):
+    """
+    Computes the comparison metrics of a single parsed trace, see METRIC_DESCRIPTION
+    :param df: parsed trace, needs at least METRIC_COLUMNS
+    :return: dict of metric name -> value
+    """
+    data_ops = df[df['operation'].isin(DATA_OPERATIONS)]
+    sizes = data_ops['size'].to_numpy(dtype=np.float64)
+    is_read = (data_ops['operation'] == 'read').to_numpy()
+    n_ops = len(data_ops)
+    total_bytes = sizes.sum()
+
+    metrics = {
+        'nprocs': df['rank'].nunique(),
+        'read_MiB': sizes[is_read].sum() / 1024 ** 2,
+        'write_MiB': sizes[~is_read].sum() / 1024 ** 2,
+        'read_ops': int(is_read.sum()),
+        'write_ops': int((~is_read).sum()),
+    }
+    if n_ops > 0:
+        io_window = data_ops['end'].max() - data_ops['start'].min()
+        per_rank = data_ops.assign(duration=data_ops['end'] - data_ops['start']) \
+            .groupby('rank').agg(bytes=('size', 'sum'), duration=('duration', 'sum'))
+        metrics['io_window_s'] = io_window
+        metrics['bandwidth_MiBps'] = total_bytes / 1024 ** 2 / io_window if io_window > 0 else np.nan
+        metrics['iops'] = n_ops / io_window if io_window > 0 else np.nan
+        metrics['mean_request_KiB'] = total_bytes / n_ops / 1024
+        metrics['seq_ratio'] = data_ops['seq'].mean()
+        metrics['consec_ratio'] = data_ops['consec'].mean()
+        metrics['rank_bytes_skew'] = per_rank['bytes'].max() / per_rank['bytes'].mean() \
+            if per_rank['bytes'].mean() > 0 else np.nan
+        metrics['rank_time_skew'] = per_rank['duration'].max() / per_rank['duration'].mean() \
+            if per_rank['duration'].mean() > 0 else np.nan
+        buckets = np.searchsorted(SIZE_BUCKET_BOUNDS, sizes, side='left')
+        size_fractions = np.bincount(buckets, minlength=len(SIZE_BIN_LABELS)) / n_ops
+    else:
+        for key in ['io_window_s', 'bandwidth_MiBps', 'iops', 'mean_request_KiB', 'seq_ratio', 'consec_ratio',
+                    'rank_bytes_skew', 'rank_time_skew']:
+            metrics[key] = np.nan
+        size_fractions = np.zeros(len(SIZE_BIN_LABELS))
+    for label, fraction in zip(SIZE_BIN_LABELS, size_fractions):
+        metrics[f'size_{label}'] = fraction
+    return metrics
+
+
+def compare_traces(frames):
+    """
+    Builds the side-by-side comparison table of several traces
+    :param frames: dict of trace name -> parsed dataframe
+    :return: dataframe with one row per trace and one column per metric
+    """
+    comparison = pd.DataFrame({name: trace_metrics(df) for name, df in frames.items()}).T
+    comparison.index.name = 'trace'
+    # drop request size buckets no trace falls into to keep the table compact
+    empty_buckets = [f'size_{label}' for label in SIZE_BIN_LABELS if (comparison[f'size_{label}'] == 0).all()]
+    return comparison.drop(columns=empty_buckets)
+
+
+def format_comparison(comparison):
+    """
+    Renders the comparison table as compact text for the assistant
+    :param comparison: output of compare_traces
+    :return:
+    """
+    description = "\n".join(f"{key}: {value}" for key, value in METRIC_DESCRIPTION.items())
+    table = comparison.to_string(float_format=lambda value: f"{value:.4g}")
+    return f"The table contains the following metrics:\n{description}\n\n{table}\n"
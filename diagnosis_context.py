@@ -0,0 +1,32 @@
+from rollups import issue_rollup_context
+from ost_stats import format_ost_stats, OST_ISSUES
+
+
+def issue_context(df, issue, exploded=None, load=None):
+    """
+    Joins every precomputed statistic handed to the assistant along with the diagnosis prompt of an issue: the time
+    rollups and, for OST related issues, the per-OST statistics
+    :param df: parsed trace
+    :param issue: issue key, e.g. 'shared_file_io'
+    :param exploded: output of ost_stats.explode_osts, computed when needed and omitted
+    :param load: output of ost_stats.ost_load, computed when needed and omitted
+    :return: prompt context, or None if the issue has none
+    """
+    contexts = [issue_rollup_context(df, issue)]
+    if issue in OST_ISSUES:
+        contexts.append(format_ost_stats(df, exploded, load))
+    contexts = [context for context in contexts if context is not None]
+    return "\n".join(contexts) if contexts else None
+
+
+def issue_contexts(df, issues, exploded=None, load=None):
+    """
+    Prompt contexts of several issues, as passed to chatUtils.get_all_diagnoses
+    :return: dict of issue -> context, without the issues that have none
+    """
+    contexts = {}
+    for issue in issues:
+        context = issue_context(df, issue, exploded, load)
+        if context is not None:
+            contexts[issue] = context
+    return contexts
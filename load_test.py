@@ -0,0 +1,198 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from chatUtils import setup_chat, get_all_diagnoses, query_diagnosis_runs, get_final_diagnoses, generate_summary, \
+    query_summary_run, get_final_summary, ISSUE_LABELS, FINAL_STATUS, FAILED_STATUS
+from diagnosis_context import issue_contexts
+from mock_openai import MockOpenAI
+
+PHASES = ['setup', 'contexts', 'diagnoses', 'final_diagnoses', 'summary']
+PERCENTILES = [50, 90, 99]
+
+
+def run_session(client, file_path, trace_df, selected_issues, poll_interval=1.0, max_polls=200):
+    """
+    Drives one analysis through the same chatUtils calls, in the same order, as app.py
+    :param file_path: parsed trace csv uploaded to the assistant
+    :param trace_df: the same trace as a dataframe, used to compute the issue contexts like the app does
+    :return: dict with the duration of every phase in seconds, the number of failed diagnosis runs and whether the
+        final summary failed
+    """
+    timings = {}
+    start = time.perf_counter()
+    assistant, chat_file, chat_formatted_issues = setup_chat(client, file_path, selected_issues)
+    timings['setup'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    contexts = issue_contexts(trace_df, chat_formatted_issues)
+    timings['contexts'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    diagnosis_runs, diagnosis_run_status, diagnosis_threads = get_all_diagnoses(client, assistant, chat_file.id,
+                                                                                chat_formatted_issues, contexts)
+    in_progress_threads = diagnosis_threads.copy()
+    in_progress_runs = diagnosis_runs.copy()
+    final_diagnoses = {}
+    failed = 0
+    final_diagnoses_time = 0.0
+    for _ in range(max_polls):
+        run_status = query_diagnosis_runs(client, in_progress_threads, in_progress_runs)
+        completed_threads = {}
+        completed_runs = {}
+        for issue, status in run_status.items():
+            if status == 'completed':
+                completed_threads[issue] = in_progress_threads.pop(issue)
+                completed_runs[issue] = in_progress_runs.pop(issue)
+            elif status in FAILED_STATUS:
+                failed += 1
+                in_progress_threads.pop(issue)
+                in_progress_runs.pop(issue)
+        if len(completed_runs) > 0:
+            final_start = time.perf_counter()
+            new_diagnoses, failed_runs = get_final_diagnoses(client, completed_threads, completed_runs)
+            final_diagnoses_time += time.perf_counter() - final_start
+            final_diagnoses.update(new_diagnoses)
+        if len(in_progress_runs) == 0:
+            break
+        time.sleep(poll_interval)
+    timings['final_diagnoses'] = final_diagnoses_time
+    timings['diagnoses'] = time.perf_counter() - start - final_diagnoses_time
+
+    start = time.perf_counter()
+    summary_thread, summary_run = generate_summary(client, assistant, final_diagnoses)
+    for _ in range(max_polls):
+        if query_summary_run(client, summary_thread, summary_run) in FINAL_STATUS:
+            break
+        time.sleep(poll_interval)
+    summary = get_final_summary(client, summary_thread, summary_run)
+    timings['summary'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings[phase] for phase in PHASES)
+    timings['failed_runs'] = failed
+    timings['summary_failed'] = summary is None
+    return timings
+
+
+def run_load_test(file_path, sessions, selected_issues, client_options, poll_interval=1.0, shared_client=False,
+                  trace_memory=False):
+    """
+    Runs the given number of sessions concurrently, each in its own thread like Streamlit script runs. A session
+    succeeds when it raised no error and got its final summary
+    :param trace_memory: also report the peak memory traced by tracemalloc. Tracing slows down every allocation, so
+        latencies and throughput of such a run are not representative
+    :return: report dict, see format_report
+    """
+    shared = MockOpenAI(**client_options) if shared_client else None
+    # read once, like the trace shared across sessions by the app
+    trace_df = pd.read_csv(file_path)
+
+    def session(index):
+        if shared is not None:
+            client = shared
+        else:
+            # offset the seed so seeded sessions do not all fail the same way
+            seed = client_options.get('seed')
+            client = MockOpenAI(**{**client_options, 'seed': None if seed is None else seed + index})
+        try:
+            return run_session(client, file_path, trace_df, selected_issues, poll_interval)
+        except Exception as e:
+            return {'error': repr(e)}
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(session, range(sessions)))
+    wall_time = time.perf_counter() - start
+    peak_traced = None
+    if trace_memory:
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # sessions that ran to the end, with or without a summary, are timed
+    finished = [result for result in results if 'error' not in result]
+    succeeded = [result for result in finished if not result['summary_failed']]
+    report = {
+        'sessions': sessions,
+        'succeeded': len(succeeded),
+        'errors': [result['error'] for result in results if 'error' in result],
+        'failed_runs': sum(result['failed_runs'] for result in finished),
+        'summary_failures': len(finished) - len(succeeded),
+        'wall_time_s': wall_time,
+        'throughput_sessions_per_s': len(succeeded) / wall_time if wall_time > 0 else 0.0,
+        'latency_s': {},
+        'tracemalloc': trace_memory,
+        'peak_traced_MiB': peak_traced / 1024 ** 2 if peak_traced is not None else None,
+        # ru_maxrss is in KiB on Linux
+        'max_rss_MiB': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+    for phase in PHASES + ['total']:
+        values = np.array([result[phase] for result in finished])
+        if len(values) > 0:
+            report['latency_s'][phase] = {f'p{p}': float(np.percentile(values, p)) for p in PERCENTILES}
+            report['latency_s'][phase]['max'] = float(values.max())
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"sessions: {report['succeeded']}/{report['sessions']} succeeded, {len(report['errors'])} errors, "
+        f"{report['summary_failures']} failed summaries, {report['failed_runs']} failed diagnosis runs",
+        f"wall time: {report['wall_time_s']:.2f} s, throughput: {report['throughput_sessions_per_s']:.3f} sessions/s",
+        f"memory: {report['max_rss_MiB']:.1f} MiB max RSS" +
+        (f", {report['peak_traced_MiB']:.1f} MiB peak traced (tracemalloc on, latencies include its overhead)"
+         if report['tracemalloc'] else " (tracemalloc off)"),
+        "latency (s):" + "".join(f"{column:>10}" for column in [f'p{p}' for p in PERCENTILES] + ['max'])
+    ]
+    for phase, values in report['latency_s'].items():
+        lines.append(f"  {phase:<17}" + "".join(f"{value:>10.3f}" for value in values.values()))
+    for error in sorted(set(report['errors'])):
+        lines.append(f"error: {error}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline load test of the analysis flow against a mocked OpenAI API")
+    parser.add_argument('--sessions', type=int, default=10, help="number of concurrent sessions")
+    parser.add_argument('--trace', default=sorted(glob.glob('csv/*.csv'))[0] if glob.glob('csv/*.csv') else None,
+                        help="parsed trace csv uploaded by every session")
+    parser.add_argument('--issues', nargs='+', default=list(ISSUE_LABELS.keys()), choices=list(ISSUE_LABELS.keys()))
+    parser.add_argument('--api-latency', type=float, default=0.05, help="seconds per API call")
+    parser.add_argument('--run-duration', type=float, default=2.0, help="seconds until a run completes")
+    parser.add_argument('--run-failure-rate', type=float, default=0.0)
+    parser.add_argument('--api-error-rate', type=float, default=0.0)
+    parser.add_argument('--images-per-run', type=int, default=0)
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="seconds between status polls")
+    parser.add_argument('--shared-client', action='store_true', help="share one client across all sessions")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also report peak memory traced by tracemalloc, which slows down the timed run")
+    parser.add_argument('--json', action='store_true', help="print the report as json")
+    args = parser.parse_args()
+
+    trace_path = os.path.abspath(args.trace)
+    # get_final_diagnoses writes images to ./images, keep them out of the repository
+    os.chdir(tempfile.mkdtemp(prefix='ion_load_test_'))
+    os.makedirs('images', exist_ok=True)
+
+    client_options = {
+        'api_latency': args.api_latency,
+        'run_duration': args.run_duration,
+        'run_failure_rate': args.run_failure_rate,
+        'api_error_rate': args.api_error_rate,
+        'images_per_run': args.images_per_run,
+        'seed': args.seed
+    }
+    load_report = run_load_test(trace_path, args.sessions, [ISSUE_LABELS[issue] for issue in args.issues],
+                                client_options, args.poll_interval, args.shared_client, args.trace_memory)
+    print(json.dumps(load_report, indent=4) if args.json else format_report(load_report))
@@ -0,0 +1,190 @@
+import itertools
+import random
+import struct
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+from chatUtils import FAILED_STATUS
+
+MOCK_CODE = "import pandas as pd\ndf = pd.read_csv('/mnt/data/trace.csv')\nprint(df.describe())"
+MOCK_LOGS = "count  1024.0\nmean   4194304.0\n"
+MOCK_STEP_TEXT = "Let me start by loading the data and looking at the I/O requests."
+MOCK_DIAGNOSIS = "**Diagnosis:** This is a mock diagnosis generated offline by mock_openai."
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+# a 1x1 transparent PNG, returned for every generated image
+MOCK_IMAGE = b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 6, 0, 0, 0)) + \
+    _png_chunk(b'IDAT', zlib.compress(b'\x00\x00\x00\x00\x00')) + _png_chunk(b'IEND', b'')
+
+
+class MockAPIError(Exception):
+    pass
+
+
+class MockOpenAI:
+    """
+    In-memory stand-in for the subset of the OpenAI Assistants API used by chatUtils: files, assistants, threads,
+    runs, run steps and messages. Objects expose the same attributes as the openai client's models, so a MockOpenAI
+    can be passed anywhere chatUtils expects the client returned by open_client()
+
+    :param api_latency: seconds every API call blocks for, like a network round-trip
+    :param run_duration: seconds a run stays in progress before it completes
+    :param run_failure_rate: probability that a run ends as 'failed' instead of 'completed'
+    :param api_error_rate: probability that any API call raises MockAPIError
+    :param images_per_run: number of image files attached to the final message of each run
+    :param seed: seed of the failure injection
+    """
+
+    def __init__(self, api_latency=0.05, run_duration=2.0, run_failure_rate=0.0, api_error_rate=0.0,
+                 images_per_run=0, seed=None):
+        self.api_latency = api_latency
+        self.run_duration = run_duration
+        self.run_failure_rate = run_failure_rate
+        self.api_error_rate = api_error_rate
+        self.images_per_run = images_per_run
+        self.calls = 0
+
+        self._random = random.Random(seed)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._files = {}
+        self._threads = {}
+        self._runs = {}
+
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(create=self._create_assistant),
+            threads=SimpleNamespace(
+                create=self._create_thread,
+                runs=SimpleNamespace(
+                    create=self._create_run,
+                    retrieve=self._retrieve_run,
+                    steps=SimpleNamespace(list=self._list_steps)
+                ),
+                messages=SimpleNamespace(list=self._list_messages)
+            )
+        )
+
+    def _call(self):
+        """
+        Simulates the latency and the failures of a single API request
+        """
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.api_error_rate
+        time.sleep(self.api_latency)
+        if fail:
+            raise MockAPIError("Injected API error")
+
+    def _new_id(self, prefix):
+        return f"{prefix}-mock{next(self._ids)}"
+
+    @staticmethod
+    def _text_message(message_id, role, text):
+        return SimpleNamespace(
+            id=message_id,
+            role=role,
+            content=[SimpleNamespace(type='text', text=SimpleNamespace(value=text))]
+        )
+
+    def _create_file(self, file, purpose):
+        self._call()
+        data = file.read()
+        file.close()
+        file_id = self._new_id('file')
+        with self._lock:
+            self._files[file_id] = data
+        return SimpleNamespace(id=file_id, bytes=len(data), purpose=purpose)
+
+    def _file_content(self, file_id):
+        self._call()
+        with self._lock:
+            data = self._files[file_id]
+        return SimpleNamespace(read=lambda: data)
+
+    def _create_assistant(self, instructions, model, tools=None, file_ids=None):
+        self._call()
+        return SimpleNamespace(id=self._new_id('asst'), instructions=instructions, model=model, tools=tools or [],
+                               file_ids=file_ids or [])
+
+    def _create_thread(self, messages=None):
+        self._call()
+        thread_id = self._new_id('thread')
+        # messages are listed newest first
+        thread_messages = [self._text_message(self._new_id('msg'), message['role'], message['content'])
+                           for message in messages or []][::-1]
+        with self._lock:
+            self._threads[thread_id] = thread_messages
+        return SimpleNamespace(id=thread_id)
+
+    def _create_run(self, thread_id, assistant_id):
+        self._call()
+        run_id = self._new_id('run')
+        with self._lock:
+            final_status = 'failed' if self._random.random() < self.run_failure_rate else 'completed'
+            self._runs[run_id] = SimpleNamespace(
+                id=run_id,
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                status='queued',
+                final_status=final_status,
+                done_at=time.monotonic() + self.run_duration,
+                steps=[]
+            )
+        return self._retrieve_run(thread_id, run_id, count_call=False)
+
+    def _finish_run(self, run):
+        """
+        Writes the messages and steps of a run once its duration elapsed, newest first like the real API lists them
+        """
+        run.status = run.final_status
+        if run.status in FAILED_STATUS:
+            return
+        step_message = self._text_message(self._new_id('msg'), 'assistant', MOCK_STEP_TEXT)
+        final_message = self._text_message(self._new_id('msg'), 'assistant', MOCK_DIAGNOSIS)
+        for _ in range(self.images_per_run):
+            file_id = self._new_id('file')
+            self._files[file_id] = MOCK_IMAGE
+            final_message.content.append(SimpleNamespace(type='image_file',
+                                                         image_file=SimpleNamespace(file_id=file_id)))
+        code_call = SimpleNamespace(
+            type='code_interpreter',
+            code_interpreter=SimpleNamespace(input=MOCK_CODE, outputs=[SimpleNamespace(type='logs', logs=MOCK_LOGS)])
+        )
+        run.steps = [
+            SimpleNamespace(step_details=SimpleNamespace(
+                type='message_creation', message_creation=SimpleNamespace(message_id=final_message.id))),
+            SimpleNamespace(step_details=SimpleNamespace(type='tool_calls', tool_calls=[code_call])),
+            SimpleNamespace(step_details=SimpleNamespace(
+                type='message_creation', message_creation=SimpleNamespace(message_id=step_message.id)))
+        ]
+        self._threads[run.thread_id][:0] = [final_message, step_message]
+
+    def _retrieve_run(self, thread_id, run_id, count_call=True):
+        if count_call:
+            self._call()
+        with self._lock:
+            run = self._runs[run_id]
+            if run.status in ('queued', 'in_progress'):
+                if time.monotonic() >= run.done_at:
+                    self._finish_run(run)
+                else:
+                    run.status = 'in_progress'
+            return SimpleNamespace(id=run.id, thread_id=run.thread_id, assistant_id=run.assistant_id,
+                                   status=run.status)
+
+    def _list_steps(self, thread_id, run_id):
+        self._call()
+        with self._lock:
+            return SimpleNamespace(data=list(self._runs[run_id].steps))
+
+    def _list_messages(self, thread_id):
+        self._call()
+        with self._lock:
+            return SimpleNamespace(data=list(self._threads[thread_id]))
@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from rollups import DEFAULT_N_BINS, rollup_io
+
+# an OST is reported as a hotspot when it moves this many times the mean bytes of the OSTs in use
+HOTSPOT_FACTOR = 2.0
+# issues whose diagnosis gets the per-OST statistics as extra context
+OST_ISSUES = ['shared_file_io']
+OST_CONTEXT = "The following per-OST statistics have already been computed from the ost column of the trace:\n"
+
+
+def ost_csr(df):
+    """
+    Reads the 'ost' column as a CSR structure: the OST IDs of row i are ids[indptr[i]:indptr[i + 1]]. Rows without
+    OST information have no entries
+    :param df: parsed trace, with 'ost' as the integer lists of parse_trace or as comma-separated IDs (e.g. read back
+        from the CSV)
+    :return: indptr (int64, len(df) + 1), ids (int32)
+    """
+    indptr = np.zeros(len(df) + 1, dtype=np.int64)
+    if isinstance(df['ost'].dtype, pd.ArrowDtype):
+        # the lists already are a CSR structure, only the lengths and the flattened values are needed
+        osts = pa.array(df['ost'].array)
+        np.cumsum(pc.list_value_length(osts).fill_null(0).to_numpy(), out=indptr[1:])
+        return indptr, pc.list_flatten(osts).to_numpy().astype(np.int32)
+
+    osts = df['ost'].fillna('').astype(str).to_numpy()
+    lengths = np.fromiter(map(len, osts), dtype=np.int64, count=len(osts))
+    # count the commas of every row on the raw bytes of all rows concatenated
+    is_comma = np.frombuffer(''.join(osts).encode('ascii'), dtype=np.uint8) == ord(',')
+    comma_counts = np.zeros(len(is_comma) + 1, dtype=np.int64)
+    np.cumsum(is_comma, out=comma_counts[1:])
+    row_ends = np.cumsum(lengths)
+    counts = np.where(lengths > 0, comma_counts[row_ends] - comma_counts[row_ends - lengths] + 1, 0)
+    np.cumsum(counts, out=indptr[1:])
+    if indptr[-1] == 0:
+        return indptr, np.zeros(0, dtype=np.int32)
+    ids = np.fromstring(','.join(osts[lengths > 0]), dtype=np.int32, sep=',')
+    return indptr, ids
+
+
+def explode_osts(df, columns=('size', 'start', 'end')):
+    """
+    Exploded view of the trace with one row per (request, OST) pair. The request size is split evenly across the
+    OSTs it touched, which is exact for stripe-aligned requests and an approximation otherwise
+    :param df: parsed trace
+    :param columns: request columns to carry over, string columns are better looked up through 'row' on demand
+    :return: dataframe with 'row' (position of the request in df), 'ost_id', the requested columns and 'ost_bytes'
+    """
+    indptr, ids = ost_csr(df)
+    counts = np.diff(indptr)
+    rows = np.repeat(np.arange(len(df)), counts)
+    exploded = pd.DataFrame({'row': rows, 'ost_id': ids})
+    for column in columns:
+        exploded[column] = df[column].to_numpy()[rows]
+    if 'size' in columns:
+        exploded['ost_bytes'] = exploded['size'].to_numpy() / counts[rows]
+    return exploded
+
+
+def _peak_concurrency(ost_ids, starts, ends):
+    """
+    Maximum number of requests in flight at the same time on each OST. The peak is reached at some request start, so
+    for every start the requests of the same OST started but not yet ended are counted with a binary search over the
+    sorted starts and ends
+    :return: series indexed by OST ID
+    """
+    if len(ost_ids) == 0:
+        return pd.Series(dtype=np.int64)
+    t0 = starts.min()
+    # shift every OST into its own disjoint time range so a single sort orders by (OST, time)
+    span = ends.max() - t0 + 1.0
+    start_keys = np.sort(ost_ids * span + (starts - t0))
+    end_keys = np.sort(ost_ids * span + (ends - t0))
+    # requests ending exactly when another starts do not count as overlapping
+    in_flight = np.searchsorted(start_keys, start_keys, side='right') - \
+        np.searchsorted(end_keys, start_keys, side='right')
+    sorted_ids = np.floor(start_keys / span).astype(np.int64)
+    group_starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    return pd.Series(np.maximum.reduceat(in_flight, group_starts), index=sorted_ids[group_starts])
+
+
+def _distinct_per_group(group_ids, codes, n_groups):
+    if len(codes) == 0:
+        return np.zeros(n_groups, dtype=np.int64)
+    n_codes = codes.max() + 1
+    pairs = np.unique(group_ids * n_codes + codes)
+    return np.bincount(pairs // n_codes, minlength=n_groups)
+
+
+def ost_load(df, exploded=None):
+    """
+    Per-OST load statistics of a trace
+    :param df: parsed trace, the one exploded was built from
+    :param exploded: output of explode_osts, computed when omitted
+    :return: dataframe indexed by OST ID with bytes, requests, distinct ranks, busy time, peak concurrency and the share
+        of all OST bytes, sorted by bytes
+    """
+    if exploded is None:
+        exploded = explode_osts(df)
+    ost_ids = exploded['ost_id'].to_numpy().astype(np.int64)
+    rows = exploded['row'].to_numpy()
+    starts = exploded['start'].to_numpy()
+    ends = exploded['end'].to_numpy()
+    # OST IDs are small dense integers, so every aggregate is a bincount
+    n_osts = ost_ids.max() + 1 if len(ost_ids) > 0 else 0
+    requests = np.bincount(ost_ids, minlength=n_osts)
+    load = pd.DataFrame({
+        'bytes': np.bincount(ost_ids, weights=exploded['ost_bytes'].to_numpy(), minlength=n_osts),
+        'requests': requests,
+        # factorize the request rows rather than the larger exploded ones
+        'ranks': _distinct_per_group(ost_ids, pd.factorize(df['rank'])[0][rows], n_osts),
+        'files': _distinct_per_group(ost_ids, pd.factorize(df['file_name'])[0][rows], n_osts),
+        'busy_s': np.bincount(ost_ids, weights=ends - starts, minlength=n_osts)
+    }, index=pd.Index(np.arange(n_osts), name='ost_id'))[requests > 0]
+    load['peak_concurrency'] = _peak_concurrency(ost_ids, starts, ends)
+    total_bytes = load['bytes'].sum()
+    load['bytes_share'] = load['bytes'] / total_bytes if total_bytes > 0 else 0.0
+    return load.sort_values(by='bytes', ascending=False)
+
+
+def ost_hotspots(load, factor=HOTSPOT_FACTOR):
+    """
+    OSTs moving more than factor times the mean bytes of all OSTs in use
+    :param load: output of ost_load
+    :return: subset of load
+    """
+    if len(load) == 0:
+        return load
+    return load[load['bytes'] > factor * load['bytes'].mean()]
+
+
+def file_ost_usage(df, exploded):
+    """
+    Number of distinct OSTs and ranks per file, e.g. to spot shared files accessed by many ranks but striped over few
+    OSTs
+    :param df: parsed trace, the one exploded was built from
+    :param exploded: output of explode_osts
+    :return: dataframe indexed by file name
+    """
+    rows = exploded['row'].to_numpy()
+    file_codes, file_names = pd.factorize(df['file_name'])
+    file_ids = file_codes[rows].astype(np.int64)
+    rank_ids = pd.factorize(df['rank'])[0][rows]
+    ost_ids = exploded['ost_id'].to_numpy().astype(np.int64)
+    usage = pd.DataFrame({
+        'osts': _distinct_per_group(file_ids, ost_ids, len(file_names)),
+        'ranks': _distinct_per_group(file_ids, rank_ids, len(file_names)),
+        'bytes': np.bincount(file_ids, weights=exploded['ost_bytes'].to_numpy(), minlength=len(file_names))
+    }, index=pd.Index(file_names, name='file_name'))
+    return usage[usage['osts'] > 0].sort_values(by='bytes', ascending=False)
+
+
+def ost_concurrency(exploded, n_bins=DEFAULT_N_BINS, bin_width=None):
+    """
+    Time-binned bytes, requests and mean number of requests in flight per OST
+    :param exploded: output of explode_osts
+    :return: rollup as returned by rollups.rollup_io, grouped by 'ost_id'
+    """
+    return rollup_io(exploded.assign(size=exploded['ost_bytes']), by=('ost_id',), n_bins=n_bins, bin_width=bin_width)
+
+
+def format_ost_stats(df, exploded=None, load=None, max_rows=20):
+    """
+    Renders the per-OST load, hotspots and per-file OST usage as compact text for the assistant
+    :param df: parsed trace
+    :param exploded: output of explode_osts, computed when omitted
+    :param load: output of ost_load, computed when omitted
+    :return: prompt context, or None if the trace carries no OST information
+    """
+    if exploded is None:
+        exploded = explode_osts(df)
+    if len(exploded) == 0:
+        return None
+    if load is None:
+        load = ost_load(df, exploded)
+    hotspots = ost_hotspots(load)
+    usage = file_ost_usage(df, exploded)
+    float_format = lambda value: f"{value:.4g}"
+    context = OST_CONTEXT
+    context += f"Load per OST (bytes are split evenly across the OSTs a request touched), top {max_rows} by bytes:\n"
+    context += load.head(max_rows).to_string(float_format=float_format) + "\n"
+    if len(hotspots) > 0:
+        context += f"OSTs moving more than {HOTSPOT_FACTOR:g}x the mean bytes per OST: " \
+                   f"{', '.join(str(ost_id) for ost_id in hotspots.index)}\n"
+    else:
+        context += f"No OST moves more than {HOTSPOT_FACTOR:g}x the mean bytes per OST.\n"
+    context += f"OSTs and ranks per file, top {max_rows} by bytes:\n"
+    context += usage.head(max_rows).to_string(float_format=float_format) + "\n"
+    return context
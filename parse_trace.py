@@ -1,4 +1,6 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import json
 import re
 
@@ -27,6 +29,11 @@ ISSUES = {
 
 }
 
+OST_ID_PATTERN = re.compile(r'\d+')
+# the 'ost' column holds the OST IDs of every request as an integer list
+OST_TYPE = pa.list_(pa.int32())
+
+
 def extract_seq_consec_ops(df):
     # sort by rank and start time
     df.sort_values(by=['rank', 'index'], inplace=True)
@@ -105,10 +112,10 @@ def parse_darshan_txt(txt_output):
             starts.append(float(parts[6]) + trace_start_time)
             ends.append(float(parts[7]) + trace_start_time)
             if len(parts) >= 9:
-                ost_info = ','.join(parts[9:]).replace(']', '')
-                osts.append(ost_info)
+                # OSTs are printed as '[  3] [  5]', keep only the IDs, e.g. [3, 5]
+                osts.append([int(ost_id) for ost_id in OST_ID_PATTERN.findall(' '.join(parts[8:]))])
             else:
-                osts.append('')
+                osts.append([])
                 
     # Create DataFrame
     df = pd.DataFrame({
@@ -122,7 +129,7 @@ def parse_darshan_txt(txt_output):
         'size': sizes,
         'start': starts,
         'end': ends,
-        'ost': osts
+        'ost': pd.arrays.ArrowExtensionArray(pa.array(osts, type=OST_TYPE))
     })
     df = pd.DataFrame.from_dict(df).sort_values(by=['start'])
     df.reset_index(inplace=True)
@@ -143,7 +150,7 @@ def create_prompt(file, df, issue):
         "size": "amount of data read from or written to a file during an I/O operation in bytes",
         "start": "unix timestamp of the start of the I/O operation",
         "end": "unix timestamp of the end of the I/O operation",
-        "ost": "lustre OST used by the I/O operation",
+        "ost": "comma-separated IDs of the lustre OSTs used by the I/O operation",
         "consec": "boolean to indicate if current offset is greater than the previous offset+size",
         "seq": "boolean to indicate if current offset is equal to the previous offset + size"
     }
@@ -159,6 +166,19 @@ def create_prompt(file, df, issue):
     return prompt
 
 
+def ost_to_text(df):
+    """
+    Returns the trace with the 'ost' lists written as comma-separated IDs, e.g. '3,5', for the CSV handed to the
+    assistant
+    :param df:
+    :return:
+    """
+    if not isinstance(df['ost'].dtype, pd.ArrowDtype):
+        return df
+    osts = pc.binary_join(pc.cast(pa.array(df['ost'].array), pa.list_(pa.string())), ',').fill_null('')
+    return df.assign(ost=osts.to_numpy(zero_copy_only=False))
+
+
 def parse_darshan_log_header(log_file):
     data = {}
     metadata = []
@@ -234,7 +254,7 @@ if __name__ == '__main__':
     df = extract_seq_consec_ops(df)
     print(df)
     # save to csv
-    df.to_csv(f'csv/{file_name.split(".")[0]}.csv', index=False)
+    ost_to_text(df).to_csv(f'csv/{file_name.split(".")[0]}.csv', index=False)
     # create prompt
     prompt = create_prompt(file_name, df, 'shared_file_io_extended')
     print(prompt)
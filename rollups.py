@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_N_BINS = 100
+# coarser resolution used when the rollup is handed to the assistant as text
+PROMPT_N_BINS = 10
+# groups with the most and the least bytes kept in the prompt text and in the charts, the rest is only reflected
+# in the min/median/max over all groups
+PROMPT_MAX_GROUPS = 5
+CHART_MAX_GROUPS = 10
+ROLLUP_VALUES = ['bytes', 'ops', 'bandwidth_MiBps', 'iops', 'concurrency']
+# (group by columns, value) rollups computed locally for the issues that need them
+ISSUE_ROLLUPS = {
+    'load_imbalanced_io': [(('rank',), 'bandwidth_MiBps'), (('rank',), 'iops')],
+    'high_metadata_io': [(('operation',), 'iops'), (('operation',), 'bandwidth_MiBps')]
+}
+ROLLUP_CONTEXT = "The following time-binned statistics have already been computed from the trace and plotted for the user, so you do not need to generate plots of them:\n"
+
+
+def _spread(group_ids, n_groups, rel_starts, rel_ends, weights, n_bins):
+    """
+    Distributes each weight over the bins its [start, end) interval overlaps, proportionally to the overlap.
+    Starts and ends are given in bin units relative to the first bin edge
+    :return: (n_groups, n_bins) array of binned weights
+    """
+    out = np.zeros(n_groups * n_bins)
+    durations = rel_ends - rel_starts
+    rates = np.divide(weights, durations, out=np.zeros_like(weights), where=durations > 0)
+    # clip to the binned window after computing the rates so mass outside of it is dropped
+    starts = np.clip(rel_starts, 0, n_bins)
+    ends = np.clip(rel_ends, 0, n_bins)
+    first = np.minimum(np.floor(starts).astype(np.int64), n_bins - 1)
+    last = np.minimum(np.floor(ends).astype(np.int64), n_bins - 1)
+    base = group_ids * n_bins
+
+    # zero-length operations (and those in a single bin) land entirely in their start bin
+    instant = durations <= 0
+    inside = instant & (rel_starts >= 0) & (rel_starts <= n_bins)
+    out += np.bincount(base[inside] + first[inside], weights=weights[inside], minlength=out.size)
+    single = ~instant & (first == last)
+    out += np.bincount(base[single] + first[single], weights=rates[single] * (ends[single] - starts[single]),
+                       minlength=out.size)
+
+    multi = ~instant & (first < last)
+    out += np.bincount(base[multi] + first[multi], weights=rates[multi] * (first[multi] + 1 - starts[multi]),
+                       minlength=out.size)
+    out += np.bincount(base[multi] + last[multi], weights=rates[multi] * (ends[multi] - last[multi]),
+                       minlength=out.size)
+    # bins strictly between first and last are fully covered, add the rate to them with a difference array
+    steps = np.bincount(base[multi] + first[multi] + 1, weights=rates[multi], minlength=out.size + 1) \
+        - np.bincount(base[multi] + last[multi], weights=rates[multi], minlength=out.size + 1)
+    out += np.cumsum(steps)[:-1]
+    return out.reshape(n_groups, n_bins)
+
+
+def rollup_io(df, by=('rank',), bin_width=None, n_bins=DEFAULT_N_BINS, t0=None, t1=None):
+    """
+    Bins bytes and operation counts over time for every group of the given columns. Each operation contributes to
+    the bins it overlaps, weighted by the fraction of its duration falling into each bin
+    :param df: parsed trace
+    :param by: columns to group by, e.g. ('rank',), ('file_name',), ('operation',) or a combination
+    :param bin_width: bin width in seconds, derived from n_bins when omitted
+    :param n_bins: number of bins over [t0, t1] when no bin_width is given, otherwise derived from bin_width
+    :param t0: start of the binned window (unix timestamp), defaults to the first operation start
+    :param t1: end of the binned window, defaults to the last operation end
+    :return: long dataframe with the group columns, 'bin', 'time' (seconds since t0 at the start of the bin) and
+        ROLLUP_VALUES, containing only bins with activity
+    """
+    by = list(by)
+    if len(df) == 0:
+        return pd.DataFrame(columns=by + ['bin', 'time'] + ROLLUP_VALUES)
+    starts = df['start'].to_numpy(dtype=np.float64)
+    ends = np.maximum(df['end'].to_numpy(dtype=np.float64), starts)
+    t0 = starts.min() if t0 is None else t0
+    t1 = ends.max() if t1 is None else t1
+    if bin_width is None:
+        # keep the requested number of bins, recomputing it from the derived width can round up to one more bin
+        # holding nothing but the end of the last operation
+        bin_width = (t1 - t0) / n_bins if t1 > t0 else 1.0
+    else:
+        n_bins = max(int(np.ceil((t1 - t0) / bin_width)), 1)
+
+    grouped = df.groupby(by, sort=True)
+    group_ids = grouped.ngroup().to_numpy()
+    group_keys = grouped.size().index
+    rel_starts = (starts - t0) / bin_width
+    rel_ends = (ends - t0) / bin_width
+    # times up to t1 can still land just past the last bin edge by rounding, keep them in the last bin
+    rel_starts = np.where(starts <= t1, np.minimum(rel_starts, n_bins), rel_starts)
+    rel_ends = np.where(ends <= t1, np.minimum(rel_ends, n_bins), rel_ends)
+    binned_bytes = _spread(group_ids, len(group_keys), rel_starts, rel_ends,
+                           df['size'].to_numpy(dtype=np.float64), n_bins)
+    binned_ops = _spread(group_ids, len(group_keys), rel_starts, rel_ends, np.ones(len(df)), n_bins)
+    binned_busy = _spread(group_ids, len(group_keys), rel_starts, rel_ends, ends - starts, n_bins)
+
+    group_idx, bin_idx = np.nonzero(binned_ops)
+    rollup = group_keys.to_frame(index=False).iloc[group_idx].reset_index(drop=True)
+    rollup['bin'] = bin_idx
+    rollup['time'] = bin_idx * bin_width
+    rollup['bytes'] = binned_bytes[group_idx, bin_idx]
+    rollup['ops'] = binned_ops[group_idx, bin_idx]
+    rollup['bandwidth_MiBps'] = rollup['bytes'] / 1024 ** 2 / bin_width
+    rollup['iops'] = rollup['ops'] / bin_width
+    # busy seconds per bin over the bin width, i.e. the mean number of requests in flight
+    rollup['concurrency'] = binned_busy[group_idx, bin_idx] / bin_width
+    rollup.attrs['bin_width'] = bin_width
+    rollup.attrs['n_bins'] = n_bins
+    return rollup
+
+
+def _group_labels(keys, by):
+    if len(by) > 1:
+        return [' / '.join(str(key) for key in group) for group in keys]
+    return [str(key) for key in keys]
+
+
+def limit_groups(rollup, series, by=('rank',), max_groups=PROMPT_MAX_GROUPS):
+    """
+    Keeps the max_groups groups moving the most bytes and the max_groups moving the least, plus the min, median and
+    max of every bin over all groups, when a wide series has more than 2 * max_groups groups
+    :param rollup: output of rollup_io
+    :param series: output of pivot_rollup for the same rollup
+    :return: wide series with at most 2 * max_groups + 3 columns
+    """
+    by = list(by)
+    if series.shape[1] <= 2 * max_groups:
+        return series
+    totals = rollup.groupby(by)['bytes'].sum()
+    totals.index = _group_labels(totals.index, by)
+    ranked = totals.reindex(series.columns, fill_value=0).sort_values(ascending=False).index
+    limited = series[list(ranked[:max_groups]) + list(ranked[-max_groups:])].copy()
+    n_groups = series.shape[1]
+    limited[f'min of {n_groups}'] = series.min(axis=1)
+    limited[f'median of {n_groups}'] = series.median(axis=1)
+    limited[f'max of {n_groups}'] = series.max(axis=1)
+    return limited
+
+
+def pivot_rollup(rollup, by=('rank',), value='bandwidth_MiBps'):
+    """
+    Turns a rollup into a wide time series with one column per group, which st.line_chart/st.area_chart can render
+    directly. Bins without activity are filled with 0
+    :return:
+    """
+    by = list(by)
+    series = rollup.pivot_table(index='bin', columns=by, values=value, aggfunc='sum', fill_value=0)
+    series.columns = _group_labels(series.columns, by)
+    n_bins = rollup.attrs.get('n_bins', len(series))
+    series = series.reindex(range(n_bins), fill_value=0)
+    series.index = pd.Index(series.index * rollup.attrs.get('bin_width', 1.0), name='time')
+    return series
+
+
+def format_rollup(df, by=('rank',), value='bandwidth_MiBps', n_bins=PROMPT_N_BINS, max_groups=PROMPT_MAX_GROUPS):
+    """
+    Renders a coarse rollup as compact text for the assistant: one row per group, one column per time bin. Only the
+    groups with the most and the least bytes are listed, see limit_groups
+    :return:
+    """
+    rollup = rollup_io(df, by=by, n_bins=n_bins)
+    wide = pivot_rollup(rollup, by=by, value=value)
+    n_groups = wide.shape[1]
+    series = limit_groups(rollup, wide, by=by, max_groups=max_groups).T
+    series.columns = [f"{column:.3g}s" for column in series.columns]
+    table = series.to_string(float_format=lambda v: f"{v:.4g}")
+    selection = ""
+    if n_groups > 2 * max_groups:
+        selection = f", showing the {max_groups} of {n_groups} groups with the most and the least bytes and the " \
+                    f"min/median/max over all groups"
+    return f"{value} per {' / '.join(by)} in time bins of {rollup.attrs.get('bin_width', 0):.3g} seconds " \
+           f"(column names are the bin start relative to the first I/O operation{selection}):\n{table}\n"
+
+
+def issue_rollups(df, issue, n_bins=DEFAULT_N_BINS, max_groups=CHART_MAX_GROUPS):
+    """
+    Computes the chart series of an issue, see ISSUE_ROLLUPS. Charts show at most the max_groups groups with the most
+    and the least bytes, see limit_groups
+    :return: list of (title, wide time series) tuples, empty if the issue has no rollups
+    """
+    charts = []
+    for by, value in ISSUE_ROLLUPS.get(issue, []):
+        rollup = rollup_io(df, by=by, n_bins=n_bins)
+        series = limit_groups(rollup, pivot_rollup(rollup, by=by, value=value), by=by, max_groups=max_groups)
+        charts.append((f"{value} per {' / '.join(by)}", series))
+    return charts
+
+
+def issue_rollup_context(df, issue):
+    """
+    Renders the rollups of an issue as prompt context, or None if the issue has no rollups
+    :return:
+    """
+    if issue not in ISSUE_ROLLUPS:
+        return None
+    return ROLLUP_CONTEXT + "\n".join(format_rollup(df, by=by, value=value) for by, value in ISSUE_ROLLUPS[issue])
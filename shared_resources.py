@@ -0,0 +1,131 @@
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from chatUtils import open_client
+from parse_trace import parse_to_df
+from trace_store import content_hash, load_or_parse
+
+APP_PAGE = "./assets/app.html"
+# parsed traces kept in memory at once, shared by every session of this process
+TRACE_CACHE_ENTRIES = 8
+# reruns kept per timing series when reporting percentiles
+TIMING_HISTORY = 1000
+# clients kept at once, one per API key entered, and how long (seconds) an unused one is kept
+CLIENT_CACHE_ENTRIES = 32
+CLIENT_CACHE_TTL = 3600
+
+
+@st.cache_resource(max_entries=CLIENT_CACHE_ENTRIES, ttl=CLIENT_CACHE_TTL)
+def shared_client(api_key):
+    """
+    One OpenAI client, and with it one HTTP connection pool, per API key for the whole process instead of one per
+    rerun. Bounded so the keys typed by many sessions, including partial ones, do not pile up
+    :param api_key:
+    :return:
+    """
+    return open_client(api_key)
+
+
+@st.cache_resource
+def app_page():
+    with open(APP_PAGE) as f:
+        return f.read()
+
+
+def to_arrow_frame(df):
+    """
+    Converts a parsed trace to Arrow-backed columns. Arrow buffers are immutable, so the frame can be handed to
+    every session without copies as long as callers derive new frames (assign, filters, groupby) instead of writing
+    into it
+    :param df:
+    :return:
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # the pandas metadata cannot restore Arrow list dtypes such as the OST IDs, and there is no index to restore
+    return table.to_pandas(types_mapper=pd.ArrowDtype, ignore_metadata=True)
+
+
+@st.cache_resource
+def resident_traces():
+    """
+    Content hash -> parsed trace of the traces currently cached by shared_trace, e.g. to reuse them when comparing.
+    Weakly referenced, so traces evicted from the cache are not kept alive by it
+    :return:
+    """
+    return weakref.WeakValueDictionary()
+
+
+@st.cache_resource(max_entries=TRACE_CACHE_ENTRIES)
+def _shared_trace(trace_hash, _txt_output, _file_name):
+    df, trace_entry = load_or_parse(_txt_output, _file_name, parse_to_df)
+    df = to_arrow_frame(df)
+    resident_traces()[trace_hash] = df
+    return df, trace_entry
+
+
+def shared_trace(txt_output, file_name):
+    """
+    Parsed trace shared read-only across sessions, keyed by its content hash so identical uploads from different
+    sessions or reruns are parsed (or loaded from the trace store) only once per process
+    :param txt_output: raw trace text
+    :param file_name: uploaded file name
+    :return: Arrow-backed dataframe, trace store catalog entry
+    """
+    return _shared_trace(content_hash(txt_output), txt_output, file_name)
+
+
+class TimingStats:
+    """
+    Process-wide record of script run timings, shared by all sessions
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cold_start = None
+        self.timings = {}
+
+    def record(self, name, seconds):
+        with self._lock:
+            if self.cold_start is None:
+                self.cold_start = seconds
+            else:
+                self.timings.setdefault(name, []).append(seconds)
+                del self.timings[name][:-TIMING_HISTORY]
+
+    def summary(self):
+        with self._lock:
+            summary = {}
+            for name, values in self.timings.items():
+                values = np.array(values)
+                summary[name] = {'runs': len(values), 'p50': np.percentile(values, 50),
+                                 'p90': np.percentile(values, 90)}
+            return self.cold_start, summary
+
+
+@st.cache_resource
+def timing_stats():
+    return TimingStats()
+
+
+def report_timings(name, run_start):
+    """
+    Records how long the current script run took up to now and shows the cold start and rerun percentiles in the
+    sidebar
+    :param name: timing series, e.g. the app mode
+    :param run_start: time.perf_counter() at the top of the script
+    :return:
+    """
+    stats = timing_stats()
+    stats.record(name, time.perf_counter() - run_start)
+    cold_start, summary = stats.summary()
+    with st.sidebar.expander("Performance"):
+        st.markdown(f"Cold start: {cold_start * 1000:.0f} ms")
+        for series, values in summary.items():
+            st.markdown(f"{series} reruns: p50 {values['p50'] * 1000:.1f} ms, p90 {values['p90'] * 1000:.1f} ms "
+                        f"({values['runs']} runs)")
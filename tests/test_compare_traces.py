@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from compare_traces import trace_metrics, load_traces, SIZE_BIN_LABELS, METRIC_COLUMNS
+from test_trace_store import darshan_trace
+
+
+def size_bucket_reference(size):
+    # DARSHAN_BUCKET_INC: every bucket includes its upper bound
+    for label, upper in zip(SIZE_BIN_LABELS, [100, 1024, 10240, 102400, 1048576, 4194304, 10485760, 104857600,
+                                              1073741824]):
+        if size <= upper:
+            return label
+    return '1G_PLUS'
+
+
+def test_size_buckets_match_darshan():
+    sizes = [0, 1, 100, 101, 1024, 1025, 4096, 10240, 102400, 102401, 1048576, 1048577, 4194304, 4194305, 10485760,
+             104857600, 1073741824, 1073741825]
+    df = pd.DataFrame({'rank': 0, 'operation': 'write', 'size': sizes, 'start': np.arange(len(sizes), dtype=float),
+                       'end': np.arange(len(sizes), dtype=float) + 0.5, 'consec': True, 'seq': True})
+    metrics = trace_metrics(df)
+    expected = pd.Series([size_bucket_reference(size) for size in sizes]).value_counts() / len(sizes)
+    for label in SIZE_BIN_LABELS:
+        assert metrics[f'size_{label}'] == expected.get(label, 0.0), label
+
+
+def test_load_traces_parses_stores_and_reuses(tmp_path):
+    traces = {'a__0.txt': darshan_trace(n_ranks=2), 'b__0.txt': darshan_trace(n_ranks=3)}
+    # parsed in worker processes, then read back from the store
+    parsed, parsed_entries = load_traces(traces, store_dir=tmp_path)
+    stored, stored_entries = load_traces(traces, store_dir=tmp_path)
+    assert stored_entries == parsed_entries
+    for name in traces:
+        assert list(stored[name].columns) == METRIC_COLUMNS
+        assert trace_metrics(stored[name]) == trace_metrics(parsed[name])
+
+    # frames already in memory are used as is
+    resident_df = parsed['a__0.txt'].assign(size=1)
+    resident = {parsed_entries['a__0.txt']['content_hash']: resident_df}
+    frames, _ = load_traces(traces, store_dir=tmp_path, resident=resident)
+    assert (frames['a__0.txt']['size'] == 1).all()
+    assert list(frames['a__0.txt'].columns) == METRIC_COLUMNS
+
+    # a single new trace is parsed inline
+    frames, entries = load_traces({'c__0.txt': darshan_trace(n_ranks=1)}, store_dir=tmp_path)
+    assert entries['c__0.txt']['nprocs'] == 1
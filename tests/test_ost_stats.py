@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from ost_stats import ost_csr, explode_osts, _peak_concurrency
+from parse_trace import OST_TYPE, ost_to_text
+
+
+def random_osts(seed, n_rows=300):
+    rng = np.random.default_rng(seed)
+    return [[int(ost_id) for ost_id in rng.integers(0, 200, rng.integers(0, 5))] for _ in range(n_rows)]
+
+
+def csr_reference(osts):
+    indptr = np.cumsum([0] + [len(row) for row in osts])
+    return indptr, np.array([ost_id for row in osts for ost_id in row], dtype=np.int64)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_ost_csr_matches_reference(seed):
+    osts = random_osts(seed)
+    df = pd.DataFrame({'ost': pd.arrays.ArrowExtensionArray(pa.array(osts, type=OST_TYPE))})
+    expected_indptr, expected_ids = csr_reference(osts)
+    for frame in [df, ost_to_text(df)]:
+        indptr, ids = ost_csr(frame)
+        np.testing.assert_array_equal(indptr, expected_indptr)
+        np.testing.assert_array_equal(ids, expected_ids)
+
+
+def test_ost_csr_sliced_and_missing():
+    osts = [[1, 2], None, [3], [], [4, 5, 6]]
+    df = pd.DataFrame({'ost': pd.arrays.ArrowExtensionArray(pa.array(osts, type=OST_TYPE))}).iloc[1:]
+    indptr, ids = ost_csr(df)
+    np.testing.assert_array_equal(indptr, [0, 0, 1, 1, 4])
+    np.testing.assert_array_equal(ids, [3, 4, 5, 6])
+    indptr, ids = ost_csr(pd.DataFrame({'ost': ['1,2', np.nan, '', '3']}))
+    np.testing.assert_array_equal(indptr, [0, 2, 2, 2, 3])
+    np.testing.assert_array_equal(ids, [1, 2, 3])
+
+
+def test_explode_osts_splits_bytes():
+    df = pd.DataFrame({
+        'ost': pd.arrays.ArrowExtensionArray(pa.array([[1, 2], [], [3]], type=OST_TYPE)),
+        'size': [10, 20, 30],
+        'start': [0.0, 1.0, 2.0],
+        'end': [1.0, 2.0, 3.0]
+    })
+    exploded = explode_osts(df)
+    assert list(exploded['row']) == [0, 0, 2]
+    assert list(exploded['ost_id']) == [1, 2, 3]
+    assert list(exploded['ost_bytes']) == [5.0, 5.0, 30.0]
+
+
+def peak_concurrency_reference(ost_ids, starts, ends):
+    peaks = {}
+    for ost_id in np.unique(ost_ids):
+        mask = ost_ids == ost_id
+        # requests ending exactly when another starts do not overlap it
+        peaks[ost_id] = max(int(np.sum((starts[mask] <= start) & (ends[mask] > start))) for start in starts[mask])
+    return pd.Series(peaks)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_peak_concurrency_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 300))
+    ost_ids = rng.integers(0, 10, n)
+    # times on a coarse grid, so equal starts and touching intervals are common and exactly representable
+    starts = rng.integers(0, 40, n) * 0.25 + 1000.0
+    ends = starts + rng.integers(0, 8, n) * 0.25
+    result = _peak_concurrency(ost_ids, starts, ends)
+    expected = peak_concurrency_reference(ost_ids, starts, ends)
+    pd.testing.assert_series_equal(result.sort_index(), expected.sort_index(), check_dtype=False, check_index_type=False)
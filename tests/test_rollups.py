@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rollups import _spread, rollup_io, pivot_rollup, limit_groups
+
+
+def spread_reference(group_ids, n_groups, rel_starts, rel_ends, weights, n_bins):
+    out = np.zeros((n_groups, n_bins))
+    for group, start, end, weight in zip(group_ids, rel_starts, rel_ends, weights):
+        if end <= start:
+            if 0 <= start <= n_bins:
+                out[group, min(int(np.floor(start)), n_bins - 1)] += weight
+            continue
+        for b in range(n_bins):
+            overlap = min(end, b + 1) - max(start, b)
+            # the last bin is closed on the right, like the clipped interval in _spread
+            if overlap > 0:
+                out[group, b] += weight * overlap / (end - start)
+    return out
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_spread_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    n_ops = int(rng.integers(1, 200))
+    n_groups = int(rng.integers(1, 6))
+    n_bins = int(rng.integers(1, 20))
+    group_ids = rng.integers(0, n_groups, n_ops)
+    # intervals partly outside of the binned window, and some zero-length ones
+    rel_starts = rng.uniform(-2, n_bins + 2, n_ops)
+    rel_ends = rel_starts + rng.choice([0.0, 0.3, 1.0, 5.0], n_ops) * rng.uniform(0, 1, n_ops)
+    weights = rng.uniform(0, 100, n_ops)
+
+    result = _spread(group_ids, n_groups, rel_starts, rel_ends, weights, n_bins)
+    expected = spread_reference(group_ids, n_groups, rel_starts, rel_ends, weights, n_bins)
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_spread_on_bin_edges():
+    starts = np.array([0.0, 1.0, 2.0, 3.0])
+    ends = np.array([1.0, 3.0, 2.0, 3.0])
+    result = _spread(np.zeros(4, dtype=np.int64), 1, starts, ends, np.array([1.0, 2.0, 4.0, 8.0]), 3)
+    np.testing.assert_allclose(result, [[1.0, 1.0, 13.0]])
+
+
+def random_trace(seed, n_ranks=20, n_ops=500):
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(0, 10, n_ops)
+    return pd.DataFrame({
+        'rank': rng.integers(0, n_ranks, n_ops),
+        'operation': rng.choice(['read', 'write'], n_ops),
+        'size': rng.integers(0, 1 << 20, n_ops),
+        'start': starts,
+        'end': starts + rng.exponential(0.5, n_ops)
+    })
+
+
+def test_rollup_io_conserves_bytes():
+    df = random_trace(0)
+    rollup = rollup_io(df, n_bins=37)
+    np.testing.assert_allclose(rollup.groupby('rank')['bytes'].sum(), df.groupby('rank')['size'].sum())
+    np.testing.assert_allclose(rollup.groupby('rank')['ops'].sum(), df.groupby('rank').size())
+
+
+def test_limit_groups_keeps_extremes():
+    df = random_trace(1, n_ranks=50)
+    rollup = rollup_io(df, n_bins=10)
+    series = pivot_rollup(rollup, value='bytes')
+    limited = limit_groups(rollup, series, max_groups=3)
+    totals = df.groupby('rank')['size'].sum().sort_values(ascending=False)
+    kept = [str(rank) for rank in list(totals.index[:3]) + list(totals.index[-3:])]
+    assert list(limited.columns[:6]) == kept
+    n_groups = series.shape[1]
+    np.testing.assert_allclose(limited[f'min of {n_groups}'], series.min(axis=1))
+    np.testing.assert_allclose(limited[f'median of {n_groups}'], series.median(axis=1))
+    np.testing.assert_allclose(limited[f'max of {n_groups}'], series.max(axis=1))
+    assert limit_groups(rollup, series, max_groups=25) is series
+
+
+@pytest.mark.parametrize('n_bins', [37, 100])
+def test_rollup_io_keeps_requested_bins(n_bins):
+    # darshan prints times with 4 decimals, added to a unix start time; some of these windows used to round up to
+    # n_bins + 1 bins with a near-empty last one
+    for seed in range(300):
+        rng = np.random.default_rng(seed)
+        starts = np.round(1706044369 + rng.uniform(0, 100, 20), 4)
+        df = pd.DataFrame({'rank': 0, 'size': 1, 'start': starts, 'end': np.round(starts + rng.exponential(1, 20), 4)})
+        # a zero-length operation at the very end of the window still counts
+        df.loc[len(df)] = [0, 1, df['end'].max(), df['end'].max()]
+        rollup = rollup_io(df, n_bins=n_bins)
+        assert rollup.attrs['n_bins'] == n_bins
+        assert rollup['bin'].max() <= n_bins - 1
+        assert rollup['ops'].sum() == pytest.approx(len(df))
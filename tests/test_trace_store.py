@@ -0,0 +1,104 @@
+import os
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+from parse_trace import parse_to_df, OST_TYPE
+from trace_store import content_hash, open_catalog, store_trace, load_trace, load_or_parse, get_trace_by_hash, \
+    DATA_DIR_NAME
+
+
+def darshan_trace(n_ranks=4, n_ops=30):
+    """
+    Small DXT trace with reads and writes, interleaved in time across ranks so the start order differs from the
+    (rank, index) order, and rows with and without OSTs
+    """
+    lines = ["# start_time: 1706044369", f"# nprocs: {n_ranks}", "# run time: 12.5", "# DXT_POSIX module data"]
+    for rank in range(n_ranks):
+        lines.append(f"# DXT, file_id: {1000 + rank}, file_name: /mnt/lustre/file_{rank}")
+        lines.append(f"# DXT, rank: {rank}, hostname: node{rank}")
+        start = 0.1 + rank * 0.001
+        for i in range(n_ops):
+            operation = 'write' if i % 3 else 'read'
+            offset = i * 4096 if i % 5 else i * 8192
+            osts = f"  [{rank % 3:4d}] [{(rank + 1) % 3:4d}]" if i % 4 else ""
+            lines.append(f" X_POSIX {rank:7d} {operation} {i:9d} {offset:15d} {4096:10d} {start:11.4f} "
+                         f"{start + 0.0105:11.4f}{osts}")
+            start += 0.01
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def parsed():
+    txt_output = darshan_trace()
+    df, trace_start_time, full_runtime = parse_to_df(txt_output)
+    return txt_output, df, trace_start_time, full_runtime
+
+
+def test_load_trace_round_trip(parsed, tmp_path):
+    txt_output, df, trace_start_time, full_runtime = parsed
+    conn = open_catalog(tmp_path)
+    entry = store_trace(conn, df, 'job', content_hash(txt_output), trace_start_time, full_runtime, store_dir=tmp_path)
+    conn.close()
+
+    loaded = load_trace(entry['trace_id'], store_dir=tmp_path)
+    assert loaded['ost'].dtype == pd.ArrowDtype(OST_TYPE)
+    # rows come back in the (rank, index) order seq and consec were computed in, the index itself is not stored
+    pd.testing.assert_frame_equal(loaded, df.reset_index(drop=True))
+
+
+def test_store_trace_is_idempotent(parsed, tmp_path):
+    txt_output, df, trace_start_time, full_runtime = parsed
+    trace_hash = content_hash(txt_output)
+    conn = open_catalog(tmp_path)
+    first = store_trace(conn, df, 'job', trace_hash, trace_start_time, full_runtime, store_dir=tmp_path)
+    second = store_trace(conn, df, 'job', trace_hash, trace_start_time, full_runtime, store_dir=tmp_path)
+    assert second == first
+
+    # a crash between the parquet write and the catalog insert leaves the directory behind, storing again must
+    # neither fail nor write a second copy
+    conn.execute("DELETE FROM traces")
+    conn.commit()
+    third = store_trace(conn, df, 'job', trace_hash, trace_start_time, full_runtime, store_dir=tmp_path)
+    assert third['trace_id'] == first['trace_id']
+    assert get_trace_by_hash(conn, trace_hash)['trace_id'] == first['trace_id']
+    conn.close()
+
+    assert os.listdir(tmp_path / DATA_DIR_NAME) == [f"trace_id={first['trace_id']}"]
+    assert len(load_trace(first['trace_id'], store_dir=tmp_path)) == len(df)
+
+
+def test_load_or_parse_reuses_stored_trace(parsed, tmp_path):
+    txt_output, df, _, _ = parsed
+    calls = []
+
+    def parse_fn(txt):
+        calls.append(txt)
+        return parse_to_df(txt)
+
+    first_df, first = load_or_parse(txt_output, 'job__0.txt', parse_fn, store_dir=tmp_path)
+    second_df, second = load_or_parse(txt_output, 'job__1.txt', parse_fn, store_dir=tmp_path)
+    assert len(calls) == 1
+    assert second == first
+    assert first['job_name'] == 'job'
+    assert first['nprocs'] == 4
+    pd.testing.assert_frame_equal(second_df, first_df.reset_index(drop=True))
+
+
+def test_load_trace_projection_and_filters(parsed, tmp_path):
+    txt_output, df, _, _ = parsed
+    _, entry = load_or_parse(txt_output, 'job__0.txt', parse_to_df, store_dir=tmp_path)
+
+    columns = ['rank', 'index', 'size', 'operation']
+    loaded = load_trace(entry['trace_id'], columns=columns, store_dir=tmp_path)
+    assert list(loaded.columns) == columns
+    assert len(loaded) == len(df)
+
+    loaded = load_trace(entry['trace_id'], columns=['rank', 'index', 'offset'],
+                        filters=(ds.field('operation') == 'read') & (ds.field('offset') > 100000),
+                        store_dir=tmp_path)
+    expected = df[(df['operation'] == 'read') & (df['offset'] > 100000)][['rank', 'index', 'offset']]
+    assert list(loaded.columns) == ['rank', 'index', 'offset']
+    assert len(loaded) > 0
+    pd.testing.assert_frame_equal(loaded, expected.reset_index(drop=True))
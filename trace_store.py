@@ -0,0 +1,228 @@
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STORE_DIR = 'trace_store'
+CATALOG_NAME = 'catalog.db'
+DATA_DIR_NAME = 'data'
+# every trace lives in its own data/trace_id=<id> directory, partitioned by these columns below it
+PARTITION_COLS = ['operation']
+# parse_to_df returns rows in this order, seq/consec refer to the previous row in it
+ROW_ORDER = ['rank', 'index']
+CATALOG_COLUMNS = ['trace_id', 'job_name', 'content_hash', 'nprocs', 'n_rows', 'trace_start_time',
+                   'full_runtime', 'created_at']
+
+
+def content_hash(txt_output):
+    """
+    Hashes the raw text of a Darshan trace so identical uploads map to the same stored trace
+    :param txt_output: raw text of the trace (str or bytes)
+    :return: hex digest of the trace contents
+    """
+    if isinstance(txt_output, str):
+        txt_output = txt_output.encode('utf-8')
+    return hashlib.sha256(txt_output).hexdigest()
+
+
+def job_name_from_file(file_name):
+    """
+    Derives a job name from an uploaded file name by dropping the extension and the trailing run counter,
+    e.g. 'ior-easy_..._uniqueDir_True__0.txt' -> 'ior-easy_..._uniqueDir_True'
+    :param file_name:
+    :return:
+    """
+    stem = os.path.basename(file_name).split('.')[0]
+    return re.sub(r'_+\d+$', '', stem)
+
+
+def parse_nprocs(txt_output):
+    match = re.search(r'^# nprocs:\s*(\d+)', txt_output, re.MULTILINE)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def open_catalog(store_dir=STORE_DIR):
+    os.makedirs(os.path.join(store_dir, DATA_DIR_NAME), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(store_dir, CATALOG_NAME))
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS traces (
+            trace_id TEXT PRIMARY KEY,
+            job_name TEXT NOT NULL,
+            content_hash TEXT NOT NULL UNIQUE,
+            nprocs INTEGER,
+            n_rows INTEGER,
+            trace_start_time REAL,
+            full_runtime REAL,
+            created_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_job_name ON traces (job_name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_nprocs ON traces (nprocs)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_start ON traces (trace_start_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_created ON traces (created_at)")
+    conn.commit()
+    return conn
+
+
+def get_trace_by_hash(conn, trace_hash):
+    row = conn.execute("SELECT * FROM traces WHERE content_hash = ?", (trace_hash,)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def get_trace(conn, trace_id):
+    row = conn.execute("SELECT * FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def store_trace(conn, df, job_name, trace_hash, trace_start_time, full_runtime, nprocs=None, store_dir=STORE_DIR):
+    """
+    Writes a parsed trace into the partitioned parquet dataset and registers it in the catalog. Traces are keyed by
+    their content hash, so storing the same trace twice, from two sessions at once or again after a crash between
+    the parquet write and the catalog insert, is a no-op
+    :return: the catalog entry of the stored trace
+    """
+    existing = get_trace_by_hash(conn, trace_hash)
+    if existing is not None:
+        return existing
+
+    trace_id = trace_hash[:16]
+    if nprocs is None:
+        nprocs = int(df['rank'].nunique())
+    trace_dir = trace_path(trace_id, store_dir)
+    if not os.path.isdir(trace_dir):
+        # write next to the final location and rename it into place, so a trace directory is always complete and
+        # only ever written once. Dot-prefixed directories are skipped by the parquet dataset discovery
+        tmp_dir = os.path.join(store_dir, DATA_DIR_NAME, f'.tmp-{trace_id}-{uuid.uuid4().hex}')
+        # keep Arrow's 'item' name for list elements so list columns read back with the dtype they were parsed with
+        pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False), root_path=tmp_dir,
+                            partition_cols=PARTITION_COLS, use_compliant_nested_type=False)
+        try:
+            os.rename(tmp_dir, trace_dir)
+        except OSError:
+            # another writer renamed the same trace into place first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    entry = {
+        'trace_id': trace_id,
+        'job_name': job_name,
+        'content_hash': trace_hash,
+        'nprocs': nprocs,
+        'n_rows': len(df),
+        'trace_start_time': trace_start_time,
+        'full_runtime': full_runtime,
+        'created_at': time.time()
+    }
+    try:
+        conn.execute(
+            f"INSERT INTO traces ({', '.join(CATALOG_COLUMNS)}) VALUES ({', '.join('?' * len(CATALOG_COLUMNS))})",
+            [entry[column] for column in CATALOG_COLUMNS]
+        )
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return get_trace_by_hash(conn, trace_hash)
+    return entry
+
+
+def find_traces(conn, job_name=None, nprocs=None, since=None, until=None):
+    """
+    Looks up catalog entries, newest run first. All arguments are optional filters; since/until bound the trace
+    start time (unix timestamp)
+    :return: list of catalog entries
+    """
+    clauses = []
+    params = []
+    if job_name is not None:
+        clauses.append("job_name = ?")
+        params.append(job_name)
+    if nprocs is not None:
+        clauses.append("nprocs = ?")
+        params.append(nprocs)
+    if since is not None:
+        clauses.append("trace_start_time >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("trace_start_time <= ?")
+        params.append(until)
+    query = "SELECT * FROM traces"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY trace_start_time DESC"
+    return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+def trace_path(trace_id, store_dir=STORE_DIR):
+    return os.path.join(store_dir, DATA_DIR_NAME, f'trace_id={trace_id}')
+
+
+def open_dataset(trace_id, store_dir=STORE_DIR):
+    """
+    Opens the parquet dataset of a single trace, without discovering the partitions of every other stored trace
+    :param trace_id:
+    :return:
+    """
+    return ds.dataset(trace_path(trace_id, store_dir), format='parquet', partitioning='hive')
+
+
+def _types_mapper(arrow_type):
+    # keep list columns such as the OST IDs as Arrow lists instead of object arrays of numpy arrays
+    if pa.types.is_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def load_trace(trace_id, columns=None, filters=None, store_dir=STORE_DIR):
+    """
+    Reads a stored trace back as a dataframe, in the row order parse_to_df returned it. Only the requested columns are
+    read, and any filters are pushed down to the parquet reader so unrelated partitions and row groups are skipped
+    :param trace_id:
+    :param columns: list of columns to load, or None for all of them
+    :param filters: pyarrow.dataset expression, e.g. ds.field('operation') == 'write'
+    :return:
+    """
+    dataset = open_dataset(trace_id, store_dir)
+    table = dataset.to_table(columns=columns, filter=filters)
+    # the pandas metadata cannot restore Arrow list dtypes, the column order is restored from it below instead
+    df = table.to_pandas(types_mapper=_types_mapper, ignore_metadata=True)
+    # partition columns come back dictionary encoded and moved to the end
+    for column in PARTITION_COLS:
+        if column in df.columns:
+            df[column] = df[column].astype(str)
+    column_order = columns or [column['name'] for column in dataset.schema.pandas_metadata['columns']]
+    df = df[[column for column in column_order if column in df.columns]]
+    if all(column in df.columns for column in ROW_ORDER):
+        df = df.sort_values(by=ROW_ORDER).reset_index(drop=True)
+    return df
+
+
+def load_or_parse(txt_output, file_name, parse_fn, store_dir=STORE_DIR):
+    """
+    Returns the parsed dataframe of a trace, reusing the stored copy when the same trace was seen before
+    :param txt_output: raw trace text
+    :param file_name: uploaded file name, used to derive the job name
+    :param parse_fn: parser returning (df, trace_start_time, full_runtime), e.g. parse_trace.parse_to_df
+    :return: df, catalog entry
+    """
+    conn = open_catalog(store_dir)
+    try:
+        trace_hash = content_hash(txt_output)
+        entry = get_trace_by_hash(conn, trace_hash)
+        if entry is not None:
+            return load_trace(entry['trace_id'], store_dir=store_dir), entry
+        df, trace_start_time, full_runtime = parse_fn(txt_output)
+        entry = store_trace(conn, df, job_name_from_file(file_name), trace_hash, trace_start_time, full_runtime,
+                            nprocs=parse_nprocs(txt_output), store_dir=store_dir)
+        return df, entry
+    finally:
+        conn.close()